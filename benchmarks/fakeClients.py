@@ -0,0 +1,222 @@
+import logging
+logger = logging.getLogger(__name__)
+
+import os
+import io
+import hashlib
+import sqlite3
+import tempfile
+from time import sleep
+from datetime import datetime
+from threading import Lock
+from botocore.exceptions import ClientError
+# import custom files
+from sqlClient import MySQLClient
+from s3Client import MyS3Client
+from emailOutbox import MyEmailOutbox
+# simulated network latency (in seconds) for each fake service
+latency = {
+    "s3": float(os.environ.get("FAKES3LATENCY", 0)),
+    "db": float(os.environ.get("FAKEDBLATENCY", 0)),
+    "ses": float(os.environ.get("FAKESESLATENCY", 0)),
+    "genai": float(os.environ.get("FAKEGENAILATENCY", 0)),
+}
+# define an in-memory stand-in for the boto3 s3 client
+class FakeS3:
+    exceptions = type("exceptions", (), {"ClientError": ClientError})
+    def __init__(self):
+        self.objects = dict() # key -> (body, etag, contentEncoding)
+        self.lock = Lock()
+    def error(self, code, operation):
+        return ClientError({"Error": {"Code": code, "Message": code}}, operation)
+    def put_object(self, Bucket, Key, Body, ContentType, ContentEncoding=None):
+        sleep(latency["s3"])
+        etag = '"{}"'.format(hashlib.md5(Body).hexdigest())
+        with self.lock:
+            self.objects[Key] = (Body, etag, ContentEncoding)
+        return {"ETag": etag}
+    def get_object(self, Bucket, Key, IfNoneMatch=None):
+        sleep(latency["s3"])
+        with self.lock:
+            if Key not in self.objects:
+                raise self.error("NoSuchKey", "GetObject")
+            body, etag, contentEncoding = self.objects[Key]
+        if IfNoneMatch == etag:
+            raise self.error("304", "GetObject")
+        response = {"Body": io.BytesIO(body), "ETag": etag, "ContentLength": len(body)}
+        if contentEncoding:
+            response["ContentEncoding"] = contentEncoding
+        return response
+    def head_object(self, Bucket, Key):
+        sleep(latency["s3"])
+        with self.lock:
+            if Key not in self.objects:
+                raise self.error("404", "HeadObject")
+            body, etag, _ = self.objects[Key]
+        return {"ETag": etag, "ContentLength": len(body)}
+    def get_paginator(self, operation):
+        fakeS3 = self
+        class Paginator:
+            def paginate(self, Bucket, Prefix):
+                sleep(latency["s3"])
+                with fakeS3.lock:
+                    keys = sorted(key for key in fakeS3.objects if key.startswith(Prefix))
+                yield {"Contents": [{"Key": key} for key in keys]}
+        return Paginator()
+# define an in-memory stand-in for the boto3 ses client
+class FakeSES:
+    def __init__(self):
+        self.sent = []
+    def send_email(self, Destination, Message, Source):
+        sleep(latency["ses"])
+        self.sent.append((Source, Destination["ToAddresses"], Message["Subject"]["Data"]))
+        return {"MessageId": f"fake-{len(self.sent)}"}
+# define a stand-in for the boto3 session
+class FakeSession:
+    def __init__(self):
+        self.clients = {"s3": FakeS3(), "ses": FakeSES()}
+    def client(self, name):
+        return self.clients[name]
+# define a pymysql-style cursor on top of sqlite
+class SQLiteCursor:
+    def __init__(self, conn):
+        self.cursor = conn.cursor()
+    def __enter__(self):
+        return self
+    def __exit__(self, *args):
+        self.cursor.close()
+    def execute(self, sql, params=()):
+        sleep(latency["db"])
+        # translate pymysql placeholders and store bytes (e.g. bcrypt hashes) as text like a VARCHAR column
+        params = tuple(p.decode() if isinstance(p, bytes) else p for p in params)
+        return self.cursor.execute(sql.replace("%s", "?"), params)
+    def fetchall(self):
+        return [dict(row) for row in self.cursor.fetchall()]
+    def fetchone(self):
+        row = self.cursor.fetchone()
+        return dict(row) if row else None
+    @property
+    def rowcount(self):
+        return self.cursor.rowcount
+# define a pymysql-style connection on top of sqlite
+class SQLiteConnection:
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, timeout=30, detect_types=sqlite3.PARSE_DECLTYPES)
+        self.conn.row_factory = sqlite3.Row
+    def cursor(self):
+        return SQLiteCursor(self.conn)
+    def commit(self):
+        self.conn.commit()
+    def rollback(self):
+        self.conn.rollback()
+    def close(self):
+        self.conn.close()
+# parse TIMESTAMP columns back into datetimes like pymysql does
+sqlite3.register_converter("TIMESTAMP", lambda value: datetime.strptime(value.decode(), "%Y-%m-%d %H:%M:%S"))
+# define a MySQLClient backed by a local sqlite database
+class SQLiteClient(MySQLClient):
+    def __init__(self, path):
+        super().__init__("localhost", None, None, path)
+        # create the webapp tables
+        conn = self.connect()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("CREATE TABLE IF NOT EXISTS users (username VARCHAR(255) PRIMARY KEY, password VARCHAR(255), email VARCHAR(255), confirmed BOOLEAN)")
+                cursor.execute("CREATE TABLE IF NOT EXISTS confirm (username VARCHAR(255), token VARCHAR(255), expiration TIMESTAMP)")
+                cursor.execute("CREATE TABLE IF NOT EXISTS reset (username VARCHAR(255), token VARCHAR(255), expiration TIMESTAMP)")
+            conn.commit()
+        finally:
+            self.disconnect(conn)
+    def connect(self):
+        return SQLiteConnection(self.db)
+    def delete_expired(self, column, cutoff, table, limit):
+        # sqlite doesn't support DELETE ... LIMIT, so pick the batch by rowid
+        conn = self.connect()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} WHERE {column} < %s ORDER BY {column} LIMIT %s)", (cutoff, limit))
+                deleted = cursor.rowcount
+            conn.commit()
+            return deleted
+        finally:
+            self.disconnect(conn)
+    def ensure_index(self, indexName, columns, table):
+        # sqlite has no information_schema, but supports IF NOT EXISTS
+        conn = self.connect()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS {indexName} ON {table} ({', '.join(columns)})")
+            conn.commit()
+            return True
+        finally:
+            self.disconnect(conn)
+# define stand-ins for genai response types
+class FakePart:
+    def __init__(self, text):
+        self.text = text
+class FakeContent:
+    def __init__(self, role, parts):
+        self.role = role
+        self.parts = parts
+class FakeUsage:
+    def __init__(self, promptTokens, responseTokens):
+        self.prompt_token_count = promptTokens
+        self.candidates_token_count = responseTokens
+        self.total_token_count = promptTokens + responseTokens
+class FakeResponse:
+    def __init__(self, text, promptTokens):
+        self.text = text
+        self.usage_metadata = FakeUsage(promptTokens, len(text.split()))
+# define a stand-in for a genai chat session
+class FakeChat:
+    def __init__(self, history):
+        # convert model format history into content objects
+        self.history = [
+            FakeContent(message["role"], [FakePart(part["text"]) for part in message["parts"]])
+            for message in history
+        ]
+    def send_message(self, message):
+        sleep(latency["genai"])
+        self.history.append(FakeContent("user", [FakePart(message)]))
+        text = f"That sounds meaningful. Tell me more about how you felt when you said: {message}"
+        self.history.append(FakeContent("model", [FakePart(text)]))
+        promptTokens = sum(len(part.text.split()) for content in self.history for part in content.parts)
+        return FakeResponse(text, promptTokens)
+    def get_history(self, curated=False):
+        return list(self.history)
+class FakeChats:
+    def create(self, model, history, config):
+        return FakeChat(history)
+class FakeModels:
+    def generate_content(self, model, contents, config):
+        sleep(latency["genai"])
+        text = "I went for a walk in the park and felt relaxed."
+        promptTokens = sum(len(part["text"].split()) for content in contents for part in content["parts"])
+        return FakeResponse(text, promptTokens)
+# define a stand-in for the genai client
+class FakeGenaiClient:
+    def __init__(self):
+        self.chats = FakeChats()
+        self.models = FakeModels()
+# define function to build the webapp config with local fakes (used via CONFIGFACTORY=benchmarks.fakeClients:create_config)
+def create_config():
+    dataDir = os.environ.get("FAKEDATADIR", None) or tempfile.mkdtemp(prefix="genai-fakes-")
+    logger.info("Using local fakes with data in %s", dataDir)
+    session = FakeSession()
+    return {
+        "sesClient": session.client("ses"),
+        "geminiModel": "fake-gemini",
+        "userTable": "users",
+        "resetTable": "reset",
+        "confirmTable": "confirm",
+        "emailSender": "noreply@example.com",
+        "sqlClient": SQLiteClient(os.path.join(dataDir, "genai.db")),
+        "s3Client": MyS3Client(session, "fake-bucket"),
+        "emailOutbox": MyEmailOutbox(session.client("ses"), os.path.join(dataDir, "email_outbox.db")),
+        "genaiClient": FakeGenaiClient(),
+        "chatbotConfig": None,
+        "userChatbots": {},
+        "chatbotsLock": Lock(),
+        "lastMessageTime": {},
+        "chatbotLastUsed": {},
+    }
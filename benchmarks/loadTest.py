@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# import packages
+import os
+import sys
+import json
+import random
+import socket
+import sqlite3
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+from time import perf_counter, sleep, time
+from threading import Thread, Lock
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import Request, HTTPCookieProcessor, HTTPRedirectHandler, build_opener
+rootDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+resultsDir = os.path.join(rootDir, "benchmarks", "results")
+# define a redirect handler that doesn't follow redirects (so each route is timed on its own)
+class NoRedirect(HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+# define a store for request samples shared by all simulated users
+class Recorder:
+    def __init__(self):
+        self.samples = [] # (route, latency in ms, status)
+        self.lock = Lock()
+    def add(self, route, latency, status):
+        with self.lock:
+            self.samples.append((route, latency, status))
+# define a simulated journaling user
+class SimUser:
+    def __init__(self, baseUrl, dataDir, recorder, name):
+        self.baseUrl = baseUrl
+        self.dataDir = dataDir
+        self.recorder = recorder
+        self.name = name
+        self.opener = build_opener(HTTPCookieProcessor(CookieJar()), NoRedirect())
+    def request(self, route, path, data=None, jsonBody=None):
+        # build the request body
+        headers = {}
+        body = None
+        if jsonBody is not None:
+            body = json.dumps(jsonBody).encode()
+            headers["Content-Type"] = "application/json"
+        elif data is not None:
+            body = urlencode(data).encode()
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        req = Request(self.baseUrl + path, data=body, headers=headers)
+        # send the request and record its latency and status
+        start = perf_counter()
+        try:
+            with self.opener.open(req, timeout=60) as response:
+                response.read()
+                status = response.status
+        except HTTPError as e:
+            e.read()
+            status = e.code
+        except (URLError, OSError):
+            status = 0
+        self.recorder.add(route, (perf_counter() - start) * 1000, status)
+        return status
+    def confirm_token(self):
+        # read the confirmation token straight from the fake database (stands in for the signup email)
+        conn = sqlite3.connect(os.path.join(self.dataDir, "genai.db"), timeout=30)
+        try:
+            row = conn.execute("SELECT token FROM confirm WHERE username = ?", (self.name,)).fetchone()
+            return row[0] if row else None
+        finally:
+            conn.close()
+    def setup(self):
+        # sign up, confirm email and log in
+        password = "hunter2"
+        email = f"{self.name}@example.com"
+        self.request("/signup", "/signup", data={"username": self.name, "password": password, "email": email, "confirmEmail": email})
+        self.request("/confirm_email", "/confirm_email?" + urlencode({"token": self.confirm_token() or ""}))
+        return self.request("/login", "/login", data={"username": self.name, "password": password}) == 302
+    def run(self, sessions, messages, thinkTime):
+        if not self.setup():
+            return
+        for i in range(sessions):
+            # start a new chat the first time, then pick one at random
+            choice = "new" if i == 0 else random.choice(["new", "continue"])
+            self.request(f"/start_chat[{choice}]", "/start_chat", data={"chat_choice": choice})
+            for j in range(messages):
+                # wait like a person typing their next message
+                sleep(random.expovariate(1 / thinkTime) if thinkTime else 0)
+                self.request("/send", "/send", jsonBody={"message": f"Message {j} of session {i}: today I went for a walk and met a friend."})
+# define function to pick a free local port for the webapp
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+# define function to start the webapp with local fakes in a separate process
+def start_server(dataDir, port):
+    env = dict(os.environ)
+    env["CONFIGFACTORY"] = "benchmarks.fakeClients:create_config"
+    env["FAKEDATADIR"] = dataDir
+    env["PYTHONPATH"] = rootDir
+    server = subprocess.Popen(
+        [sys.executable, "-m", "flask", "--app", "genai_webapp", "run", "--port", str(port), "--no-reload", "--no-debugger"],
+        cwd=rootDir,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    # wait for the webapp to come up
+    baseUrl = f"http://127.0.0.1:{port}"
+    deadline = time() + 60
+    while time() < deadline:
+        try:
+            with build_opener().open(baseUrl + "/ping", timeout=1):
+                return server, baseUrl
+        except (URLError, OSError):
+            sleep(0.2)
+    server.terminate()
+    raise RuntimeError("Webapp did not start within 60 seconds")
+# define function to summarize samples per route
+def summarize(samples, elapsed):
+    routes = {}
+    for route, latency, status in samples:
+        routes.setdefault(route, []).append((latency, status))
+    summary = {}
+    for route, values in sorted(routes.items()):
+        latencies = sorted(latency for latency, _ in values)
+        percentile = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+        summary[route] = {
+            "count": len(values),
+            "throughput": len(values) / elapsed,
+            "p50": percentile(0.50),
+            "p95": percentile(0.95),
+            "p99": percentile(0.99),
+            "errorRate": sum(1 for _, status in values if status == 0 or (status >= 400 and status != 429)) / len(values),
+            "rateLimitedRate": sum(1 for _, status in values if status == 429) / len(values),
+        }
+    return summary
+# define function to print the summary table
+def report(summary, elapsed, users):
+    print(f"{users} users, {elapsed:.1f}s")
+    print(f"{'route':<24} {'count':>7} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7} {'429s':>7}")
+    for route, stats in summary.items():
+        print(f"{route:<24} {stats['count']:>7} {stats['throughput']:>8.2f} {stats['p50']:>9.1f} {stats['p95']:>9.1f} {stats['p99']:>9.1f} {stats['errorRate']:>7.1%} {stats['rateLimitedRate']:>7.1%}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate concurrent journaling users against genai_webapp running with local fakes")
+    parser.add_argument("--users", type=int, default=20, help="number of simultaneous users")
+    parser.add_argument("--sessions", type=int, default=2, help="chats started by each user")
+    parser.add_argument("--messages", type=int, default=10, help="messages sent in each chat")
+    parser.add_argument("--think-time", type=float, default=3.0, help="mean seconds between a user's messages")
+    parser.add_argument("--ramp-up", type=float, default=5.0, help="seconds over which users are started")
+    parser.add_argument("--save", action="store_true", help="store the summary in benchmarks/results")
+    args = parser.parse_args()
+    # start the webapp
+    dataDir = tempfile.mkdtemp(prefix="genai-loadtest-")
+    server, baseUrl = start_server(dataDir, free_port())
+    try:
+        # run the simulated users
+        recorder = Recorder()
+        runId = datetime.now().strftime("%H%M%S")
+        threads = []
+        start = perf_counter()
+        for i in range(args.users):
+            user = SimUser(baseUrl, dataDir, recorder, f"load{runId}u{i}")
+            thread = Thread(target=user.run, args=(args.sessions, args.messages, args.think_time), daemon=True)
+            thread.start()
+            threads.append(thread)
+            sleep(args.ramp_up / args.users)
+        for thread in threads:
+            thread.join()
+        elapsed = perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait()
+    # report the results
+    summary = summarize(recorder.samples, elapsed)
+    report(summary, elapsed, args.users)
+    if args.save:
+        os.makedirs(resultsDir, exist_ok=True)
+        path = os.path.join(resultsDir, "load-" + datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+        with open(path, "w") as f:
+            json.dump({"created": datetime.now().isoformat(), "users": args.users, "elapsed": elapsed, "routes": summary}, f, indent=2)
+        print(f"Saved results to {path}")
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# import packages
+import os
+import sys
+import json
+import glob
+import argparse
+import platform
+import statistics
+from datetime import datetime
+from time import perf_counter
+# run the webapp against local fakes instead of aws/gcp
+rootDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, rootDir)
+os.environ.setdefault("CONFIGFACTORY", "benchmarks.fakeClients:create_config")
+# import custom files
+from genai_webapp import app, chat_to_obj, chat_from_obj
+from benchmarks.fakeClients import FakeContent, FakePart, latency
+resultsDir = os.path.join(rootDir, "benchmarks", "results")
+# define function to time a callable and summarize the samples (in milliseconds)
+def measure(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = perf_counter()
+        func()
+        samples.append((perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "repeat": repeat,
+        "min": samples[0],
+        "mean": statistics.mean(samples),
+        "p50": samples[len(samples) // 2],
+        "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        "max": samples[-1],
+    }
+# define function to build a synthetic chat history with the given number of turns
+def make_history(turns):
+    history = []
+    for i in range(turns):
+        history.append(FakeContent("user", [FakePart(f"Today I went to the park with Alex and we talked about turn {i}. " * 3)]))
+        history.append(FakeContent("model", [FakePart(f"That sounds lovely! How did you feel about turn {i}? " * 5)]))
+    return history
+# define microbenchmarks for chat history conversion
+def bench_conversion(repeat):
+    results = {}
+    for turns in (10, 100, 1000):
+        history = make_history(turns)
+        chatObj = chat_to_obj(history)
+        results[f"chat_to_obj[{turns}]"] = measure(lambda: chat_to_obj(history), repeat)
+        results[f"chat_from_obj[{turns}]"] = measure(lambda: chat_from_obj(chatObj), repeat)
+    return results
+# define benchmarks for the webapp routes
+def bench_routes(repeat):
+    results = {}
+    config = app.config["Config"]
+    client = app.test_client()
+    # sign up users (each signup needs a unique username)
+    counter = iter(range(10**9))
+    def signup():
+        i = next(counter)
+        response = client.post("/signup", data={"username": f"bench{i}", "password": "hunter2", "email": f"bench{i}@example.com", "confirmEmail": f"bench{i}@example.com"})
+        assert response.status_code == 200, response.status_code
+    results["POST /signup"] = measure(signup, repeat)
+    # confirm the first user
+    token = next(row["token"] for row in config["sqlClient"].read_table(config["confirmTable"]) if row["username"] == "bench0")
+    results["GET /confirm_email"] = measure(lambda: client.get(f"/confirm_email?token={token}"), 1)
+    def login():
+        response = client.post("/login", data={"username": "bench0", "password": "hunter2"})
+        assert response.status_code == 302, response.status_code
+    results["POST /login"] = measure(login, repeat)
+    results["POST /start_chat[new]"] = measure(lambda: client.post("/start_chat", data={"chat_choice": "new"}), repeat)
+    def send():
+        # skip the per-user rate limit so the route itself is measured
+        config["lastMessageTime"]["bench0"] = 0
+        response = client.post("/send", json={"message": "Today I went hiking with my sister and it was wonderful."})
+        assert response.status_code == 200, response.get_json()
+    results["POST /send"] = measure(send, repeat)
+    results["POST /start_chat[continue]"] = measure(lambda: client.post("/start_chat", data={"chat_choice": "continue"}), repeat)
+    results["GET /history"] = measure(lambda: client.get("/history?limit=20"), repeat)
+    return results
+# define function to find the most recent stored run
+def latest_result():
+    paths = sorted(glob.glob(os.path.join(resultsDir, "[0-9]*.json")))
+    return paths[-1] if paths else None
+# define function to print results side by side with a previous run
+def report(results, baseline):
+    print(f"{'benchmark':<32} {'p50 ms':>10} {'p95 ms':>10} {'mean ms':>10} {'vs base':>9}")
+    for name, stats in results.items():
+        change = ""
+        if baseline and name in baseline:
+            change = f"{(stats['mean'] / baseline[name]['mean'] - 1) * 100:+.1f}%"
+        print(f"{name:<32} {stats['p50']:>10.3f} {stats['p95']:>10.3f} {stats['mean']:>10.3f} {change:>9}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run offline benchmarks for genai_webapp against local fakes")
+    parser.add_argument("--repeat", type=int, default=50, help="number of timed calls per benchmark")
+    parser.add_argument("--compare", default=None, help="stored result to compare against (default: latest run)")
+    parser.add_argument("--no-save", action="store_true", help="don't store the results of this run")
+    args = parser.parse_args()
+    # run the benchmarks
+    results = {}
+    results.update(bench_conversion(args.repeat))
+    results.update(bench_routes(args.repeat))
+    # compare against a previous run
+    baselinePath = args.compare or latest_result()
+    baseline = None
+    if baselinePath:
+        with open(baselinePath) as f:
+            baseline = json.load(f)["results"]
+        print(f"Comparing against {baselinePath}")
+    report(results, baseline)
+    # store the results for later comparison
+    if not args.no_save:
+        os.makedirs(resultsDir, exist_ok=True)
+        path = os.path.join(resultsDir, datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+        with open(path, "w") as f:
+            json.dump({
+                "created": datetime.now().isoformat(),
+                "python": platform.python_version(),
+                "latency": latency,
+                "results": results,
+            }, f, indent=2)
+        print(f"Saved results to {path}")
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# import packages
+import os
+import sys
+import json
+import gzip
+import hashlib
+import logging
+import subprocess
+import tempfile
+from urllib.request import urlopen
+try:
+    import brotli
+except ImportError:
+    brotli = None
+# configure logger
+logging.basicConfig(stream=sys.stderr,
+                    level=logging.INFO,
+                    format="%(asctime)-11s [%(levelname)s] %(message)s (%(name)s:%(lineno)d)")
+logger = logging.getLogger(__name__)
+# set up build paths and tools
+rootDir = os.path.dirname(os.path.abspath(__file__))
+srcCss = os.path.join(rootDir, "static", "src", "app.css")
+distDir = os.path.join(rootDir, "static", "dist")
+tailwindCli = os.environ.get("TAILWINDCSS", "tailwindcss") # tailwind standalone cli (v3, bundles the typography plugin)
+markedUrl = "https://cdn.jsdelivr.net/npm/marked@15.0.12/marked.min.js" # pinned markdown renderer for the chat page
+# define function to compile the purged css bundle
+def build_css():
+    logger.info(f"Compiling {srcCss} with {tailwindCli}")
+    with tempfile.TemporaryDirectory() as tmpDir:
+        outCss = os.path.join(tmpDir, "app.css")
+        subprocess.run(
+            [tailwindCli, "-c", os.path.join(rootDir, "tailwind.config.js"), "-i", srcCss, "-o", outCss, "--minify"],
+            cwd=rootDir,
+            check=True
+        )
+        with open(outCss, "rb") as f:
+            return f.read()
+# define function to vendor a js dependency
+def fetch_js(url):
+    logger.info(f"Downloading {url}")
+    with urlopen(url) as response:
+        return response.read()
+# define function to write an asset with a content-hashed name (plus precompressed copies)
+def write_asset(name, data):
+    base, ext = os.path.splitext(name)
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    hashedName = f"{base}.{digest}{ext}"
+    hashedPath = os.path.join(distDir, hashedName)
+    with open(hashedPath, "wb") as f:
+        f.write(data)
+    with open(hashedPath + ".gz", "wb") as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli:
+        with open(hashedPath + ".br", "wb") as f:
+            f.write(brotli.compress(data, quality=11))
+    else:
+        logger.warning(f"brotli is not installed, skipping .br copy of {hashedName}")
+    logger.info(f"Wrote {hashedName} ({len(data)} bytes)")
+    return hashedName
+
+if __name__ == "__main__":
+    os.makedirs(distDir, exist_ok=True)
+    # remember the previous build so browsers with a cached page can still fetch its assets
+    manifestPath = os.path.join(distDir, "manifest.json")
+    try:
+        with open(manifestPath) as f:
+            previous = json.load(f)
+    except FileNotFoundError:
+        previous = {}
+    # build assets and record their hashed names for the webapp
+    manifest = {
+        "app.css": write_asset("app.css", build_css()),
+        "marked.min.js": write_asset("marked.min.js", fetch_js(markedUrl)),
+    }
+    with open(manifestPath, "w") as f:
+        json.dump(manifest, f, indent=2)
+    logger.info(f"Wrote asset manifest to {distDir}")
+    # remove assets from older builds (keeping this build and the previous one)
+    keep = set(manifest.values()) | set(previous.values())
+    for fileName in os.listdir(distDir):
+        if fileName != "manifest.json" and fileName.removesuffix(".gz").removesuffix(".br") not in keep:
+            os.remove(os.path.join(distDir, fileName))
+            logger.info(f"Removed stale asset {fileName}")
@@ -4,7 +4,7 @@ import os
 import json
 import sys
 import logging
-from time import datetime
+from datetime import datetime
 import boto3
 from google import genai
 from google.genai.types import (
@@ -16,6 +16,9 @@ from google.genai.types import (
 from google.oauth2 import service_account
 # import custom files
 from s3Client import MyS3Client
+from memoryIndex import MyMemoryIndex
+# chat history object versions this script can read (legacy objects are just the list of messages)
+SUPPORTED_CHAT_FORMAT_VERSIONS = (2,)
 # configure logger
 logging.basicConfig(stream=sys.stderr, 
                     level=logging.INFO, 
@@ -43,6 +46,8 @@ class Config:
             gcpProject = ssmClient.get_parameter(Name="/genai/gcpProject", WithDecryption=True)["Parameter"]["Value"] # gcp project where vertex ai resources are enabled
             gcpRegion = ssmClient.get_parameter(Name="/genai/gcpRegion", WithDecryption=True)["Parameter"]["Value"] # gcp region where vertex ai resources are enabled
             cls.configStore["geminiModel"] = ssmClient.get_parameter(Name="/genai/geminiModel", WithDecryption=True)["Parameter"]["Value"] # gemini model used for chatbot
+            cls.configStore["embedModel"] = os.environ.get("EMBEDMODEL", "text-embedding-005") # embedding model used to find near-duplicate memories
+            cls.configStore["dedupThreshold"] = float(os.environ.get("DEDUPTHRESHOLD", 0.92)) # similarity above which memories count as duplicates
             s3Bucket = ssmClient.get_parameter(Name="/genai/s3Bucket", WithDecryption=True)["Parameter"]["Value"] # aws bucket for chat history
             corpusId = ssmClient.get_parameter(Name="/genai/corpusId/test", WithDecryption=True)["Parameter"]["Value"] # test corpus id for RAG
             #corpusId =  ssmClient.get_parameter(Name="/genai/corpusId/prod", WithDecryption=True)["Parameter"]["Value"] # prod corpus id for RAG
@@ -107,16 +112,30 @@ config = Config.create()
 def extract_memories(userInput: str):
     config["logger"].debug("Getting keys for all user chat histories")
     chatKeys = config["s3Client"].obj_list("chat-history/")
+    newMemories = {}
     for chatKey in chatKeys:
         user = chatKey.split("/")[-1].split(".")[0]
         config["logger"].debug(f"Now working on {user}'s chat history...")
         config["logger"].debug("Getting chat history from s3")
         chatObj = config["s3Client"].obj_read(chatKey)
         chatJson = json.loads(chatObj)
+        # unwrap versioned objects (legacy objects are just the list of messages)
+        if isinstance(chatJson, dict):
+            version = chatJson.get("version")
+            if version not in SUPPORTED_CHAT_FORMAT_VERSIONS:
+                config["logger"].error(f"Skipping {user}'s chat history: unsupported format version {version} (supported: {SUPPORTED_CHAT_FORMAT_VERSIONS})")
+                continue
+            chatJson = chatJson["history"]
+        # load the user's memory index and skip turns summarized on a previous run
+        memoryIndex = MyMemoryIndex(config["s3Client"], config["genaiClient"], config["embedModel"], user, config["dedupThreshold"])
+        newTurns = memoryIndex.unprocessed(chatJson)
+        if not newTurns:
+            config["logger"].debug(f"No new chat history for {user}")
+            continue
         config["logger"].debug("Summarizing chat history")
         chatHistory = " ".join(
             part
-            for message in chatJson
+            for message in newTurns
             for part in message["parts"]
         )
         today = datetime.today().strftime("%B %d, %Y")
@@ -125,4 +144,12 @@ def extract_memories(userInput: str):
             model=config["geminiModel"],
             contents=[{"role": "user", "parts": [{"text": chatWithContext}]}],
             config=config["memoryConfig"]
-        )
\ No newline at end of file
+        )
+        # keep the memory only if it isn't a duplicate of one already extracted
+        memory = (response.text or "").strip()
+        if memory and memoryIndex.add(memory):
+            newMemories.setdefault(user, []).append(memory)
+        memoryIndex.mark_processed(chatJson)
+        memoryIndex.save()
+    # return the unique memories ready for ingestion
+    return newMemories
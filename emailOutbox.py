@@ -0,0 +1,170 @@
+import logging
+logger = logging.getLogger(__name__)
+
+import json
+import sqlite3
+from time import time
+from threading import Event
+# define an email outbox class
+class MyEmailOutbox:
+    def __init__(self, sesClient, path, batchSize=10, maxAttempts=5, baseDelay=30, leaseTime=300):
+        # save the ses client and outbox settings
+        self.sesClient = sesClient
+        self.path = path
+        self.batchSize = batchSize # max number of emails sent per drain cycle
+        self.maxAttempts = maxAttempts # number of attempts before an email is dead-lettered
+        self.baseDelay = baseDelay # seconds to wait before the first retry (doubles on every retry)
+        self.leaseTime = leaseTime # seconds a claimed email is hidden from other senders
+        # event used to wake up the sender when new mail is queued
+        self.wakeup = Event()
+        # ids of emails ses accepted but that couldn't be removed from the outbox yet
+        self.sentIds = set()
+        # create the outbox table if it doesn't exist
+        conn = self.connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    sender TEXT NOT NULL,
+                    recipients TEXT NOT NULL,
+                    subject TEXT NOT NULL,
+                    body TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    nextAttempt REAL NOT NULL,
+                    lastError TEXT,
+                    created REAL NOT NULL
+                )
+                """)
+            conn.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, nextAttempt)")
+            conn.commit()
+        finally:
+            conn.close()
+        logger.debug("MyEmailOutbox initialized with outbox: %s", path)
+    def connect(self):
+        # open a new connection (sqlite connections can't be shared across threads)
+        return sqlite3.connect(self.path, timeout=30)
+    def enqueue(self, sender, recipients, subject, body):
+        logger.debug("Queueing email to: %s", recipients)
+        conn = self.connect()
+        # try to add the email to the outbox
+        try:
+            now = time()
+            conn.execute(
+                "INSERT INTO outbox (sender, recipients, subject, body, nextAttempt, created) VALUES (?, ?, ?, ?, ?, ?)",
+                (sender, json.dumps(recipients), subject, body, now, now)
+            )
+            conn.commit()
+            logger.debug("Email to %s queued successfully", recipients)
+        except Exception as e:
+            logger.error("Failed to queue email to %s: %s", recipients, e, exc_info=True)
+            raise
+        finally:
+            conn.close()
+        # let the sender know there is new mail
+        self.wakeup.set()
+    def claim_batch(self):
+        conn = self.connect()
+        # claim due emails in a single write transaction so no other sender picks them up
+        try:
+            now = time()
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT id, sender, recipients, subject, body, attempts FROM outbox WHERE status = 'pending' AND nextAttempt <= ? ORDER BY nextAttempt LIMIT ?",
+                (now, self.batchSize)
+            ).fetchall()
+            # hide claimed emails until the lease runs out (they're retried if this process dies mid-send)
+            conn.executemany(
+                "UPDATE outbox SET nextAttempt = ? WHERE id = ?",
+                [(now + self.leaseTime, row[0]) for row in rows]
+            )
+            conn.commit()
+            return rows
+        except Exception as e:
+            conn.rollback()
+            logger.error("Failed to claim emails from outbox: %s", e, exc_info=True)
+            return []
+        finally:
+            conn.close()
+    def mark_sent(self, conn, emailId):
+        # remove the email from the outbox once ses has accepted it
+        try:
+            conn.execute("DELETE FROM outbox WHERE id = ?", (emailId,))
+            conn.commit()
+            self.sentIds.discard(emailId)
+        except Exception as e:
+            # remember it so it isn't sent again while the delete is retried
+            self.sentIds.add(emailId)
+            logger.error("Failed to remove sent email %s from outbox, will retry: %s", emailId, e)
+    def mark_failed(self, conn, emailId, recipients, attempts, error):
+        attempts += 1
+        # dead-letter the email if it has run out of attempts
+        if attempts >= self.maxAttempts:
+            logger.error("Giving up on email %s to %s after %s attempts: %s", emailId, recipients, attempts, error)
+            conn.execute(
+                "UPDATE outbox SET status = 'dead', attempts = ?, lastError = ? WHERE id = ?",
+                (attempts, str(error), emailId)
+            )
+        # otherwise, retry with exponential backoff
+        else:
+            delay = self.baseDelay * 2 ** (attempts - 1)
+            logger.warning("Error sending email %s to %s (attempt %s), retrying in %ss: %s", emailId, recipients, attempts, delay, error)
+            conn.execute(
+                "UPDATE outbox SET attempts = ?, lastError = ?, nextAttempt = ? WHERE id = ?",
+                (attempts, str(error), time() + delay, emailId)
+            )
+        conn.commit()
+    def send_batch(self):
+        conn = self.connect()
+        try:
+            # retry removing emails that were sent but couldn't be removed from the outbox
+            for emailId in list(self.sentIds):
+                self.mark_sent(conn, emailId)
+        finally:
+            conn.close()
+        # get the next batch of due emails
+        rows = self.claim_batch()
+        if not rows:
+            return 0
+        logger.debug("Sending batch of %s emails", len(rows))
+        sent = 0
+        conn = self.connect()
+        try:
+            for emailId, sender, recipients, subject, body, attempts in rows:
+                recipients = json.loads(recipients)
+                # don't send an email again if ses already accepted it
+                if emailId in self.sentIds:
+                    self.mark_sent(conn, emailId)
+                    continue
+                # try to send the email through ses
+                try:
+                    charset = "UTF-8"
+                    res = self.sesClient.send_email(Destination={ "ToAddresses": recipients },
+                                                    Message={ "Body": { "Text": { "Charset": charset, "Data": body } },
+                                                              "Subject": { "Charset": charset, "Data": subject } },
+                                                    Source=sender)
+                except Exception as e:
+                    self.mark_failed(conn, emailId, recipients, attempts, e)
+                    continue
+                if "MessageId" in res:
+                    logger.info("Notification sent successfully: %s", res["MessageId"])
+                else:
+                    logger.warning("Notification may not have been sent: %s", res)
+                self.mark_sent(conn, emailId)
+                sent += 1
+        finally:
+            conn.close()
+        return sent
+    def drain(self, interval=5):
+        logger.info("Starting email outbox sender for: %s", self.path)
+        while True:
+            # keep sending while there are full batches waiting
+            try:
+                while self.send_batch() >= self.batchSize:
+                    pass
+            except Exception as e:
+                logger.error("Unexpected error draining email outbox: %s", e, exc_info=True)
+            # wait for new mail or for the next retry to come due
+            self.wakeup.wait(interval)
+            self.wakeup.clear()
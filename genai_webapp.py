@@ -2,15 +2,21 @@
 # import packages
 import os
 import json
-import sys
 import logging
 import secrets
+import importlib
 from datetime import datetime, timedelta
-from time import time, sleep
+from time import time, sleep, perf_counter
 from threading import Thread, Lock
-from flask import Flask, render_template, request, redirect, url_for, jsonify, session
+import mimetypes
+from flask import Flask, render_template, request, redirect, url_for, jsonify, session, send_from_directory, g, Response
+from werkzeug.exceptions import HTTPException
 import bcrypt
 import boto3
+try:
+    import orjson
+except ImportError:
+    orjson = None
 from google import genai
 from google.genai.types import (
     GenerateContentConfig,
@@ -22,10 +28,12 @@ from google.oauth2 import service_account
 # import custom files
 from sqlClient import MySQLClient
 from s3Client import MyS3Client
-# configure logger
-logging.basicConfig(stream=sys.stderr, 
-                    level=logging.INFO, 
-                    format="%(asctime)-11s [%(levelname)s] %(message)s (%(name)s:%(lineno)d)")
+from emailOutbox import MyEmailOutbox
+from metrics import MyMetrics, InstrumentedClient, requestSpans
+from profiling import MyProfiler, TimedLock
+from logPipeline import setup_logging
+# configure logger (records are written by a background thread so requests never block on stderr)
+setup_logging(logging.INFO)
 # initialize global variables
 class Config:
     configStore = dict()
@@ -34,8 +42,15 @@ class Config:
         if not cls.configStore:
             # create logger
             cls.configStore["logger"] = logging.getLogger(__name__)
+            # let offline tools (e.g. benchmarks) supply their own clients instead of aws/gcp ones
+            configFactory = os.environ.get("CONFIGFACTORY", None)
+            if configFactory:
+                cls.configStore["logger"].info("Creating config from %s", configFactory)
+                moduleName, funcName = configFactory.split(":")
+                cls.configStore.update(getattr(importlib.import_module(moduleName), funcName)())
+                return cls.configStore
             # set up boto3 session
-            cls.configStore["logger"].debug(f"Setting up boto3")
+            cls.configStore["logger"].debug("Setting up boto3")
             awsProfile = os.environ.get("AWSPROF", None)
             if awsProfile:
                 awsSession = boto3.Session(profile_name=awsProfile, region_name="us-east-1")
@@ -62,26 +77,29 @@ class Config:
             cls.configStore["corpusId"] = ssmClient.get_parameter(Name="/genai/corpusId/test", WithDecryption=True)["Parameter"]["Value"] # test corpus id for RAG
             #cls.configStore["corpusId"] =  ssmClient.get_parameter(Name="/genai/corpusId/prod", WithDecryption=True)["Parameter"]["Value"] # prod corpus id for RAG
             # create MySQLClient instance in aws
-            cls.configStore["logger"].debug(f"Getting database credentials from AWS Secrets Manager")
+            cls.configStore["logger"].debug("Getting database credentials from AWS Secrets Manager")
             dbResponse = smClient.get_secret_value(SecretId=cls.configStore["dbSecret"])
             dbInfo = json.loads(dbResponse["SecretString"])
-            cls.configStore["logger"].debug(f"Setting up SQL client")
+            cls.configStore["logger"].debug("Setting up SQL client")
             cls.configStore["sqlClient"] = MySQLClient(cls.configStore["dbHost"], dbInfo["username"], dbInfo["password"], cls.configStore["dbName"])
             # create MyS3ChatHistory instance
-            cls.configStore["logger"].debug(f"Setting up s3 client")
+            cls.configStore["logger"].debug("Setting up s3 client")
             cls.configStore["s3Client"] = MyS3Client(awsSession, cls.configStore["s3Bucket"])
+            # create MyEmailOutbox instance for queueing ses emails
+            cls.configStore["logger"].debug("Setting up email outbox")
+            cls.configStore["emailOutbox"] = MyEmailOutbox(cls.configStore["sesClient"], os.environ.get("EMAILOUTBOX", "email_outbox.db"))
             # retrieve gcp service account key from aws secrets manager
-            cls.configStore["logger"].debug(f"Getting service account key from AWS Secrets Manager")
+            cls.configStore["logger"].debug("Getting service account key from AWS Secrets Manager")
             saResponse = smClient.get_secret_value(SecretId=cls.configStore["gcpSecret"])
             saInfo = json.loads(saResponse["SecretString"])
             # authenticate with gcloud service account
-            cls.configStore["logger"].debug(f"Authenticating GCP service account")
+            cls.configStore["logger"].debug("Authenticating GCP service account")
             credentials = service_account.Credentials.from_service_account_info(
                 saInfo,
                 scopes=["https://www.googleapis.com/auth/cloud-platform"]
                 )
             # set up genai client
-            cls.configStore["logger"].debug(f"Setting up genai client")
+            cls.configStore["logger"].debug("Setting up genai client")
             cls.configStore["genaiClient"] = genai.Client(vertexai=True, project=cls.configStore["gcpProject"], location=cls.configStore["gcpRegion"], credentials=credentials)
             # set up chatbot instructions
             chatbotInstruction = """
@@ -134,26 +152,48 @@ class Config:
             cls.configStore["chatbotLastUsed"] = {}
         return cls.configStore
 Config.create()
+# time every database and s3 call
+Config.configStore["metrics"] = MyMetrics()
+Config.configStore["sqlClient"] = InstrumentedClient(Config.configStore["sqlClient"], "mysql", Config.configStore["metrics"])
+Config.configStore["s3Client"] = InstrumentedClient(Config.configStore["s3Client"], "s3", Config.configStore["metrics"])
+# set up admin profiling (disabled unless PROFILETOKEN is set)
+Config.configStore["profiler"] = MyProfiler(os.environ.get("PROFILETOKEN", None))
+# track waits on the chatbot lock only while profiling is enabled
+if Config.configStore["profiler"].enabled():
+    Config.configStore["chatbotsLock"] = TimedLock("chatbotsLock", Config.configStore["chatbotsLock"], Config.configStore["metrics"])
 # define function to send email
-def send_email(sesClient, sender, recipients, subject, body):
+def send_email(emailOutbox, sender, recipients, subject, body):
+    # queue the email so the request doesn't wait on ses (the outbox sender delivers it in the background)
     try:
-        app.config["Config"]["logger"].debug(f"Sending notification to: {recipients}")
-        charset = "UTF-8"
-        res = sesClient.send_email(Destination={ "ToAddresses": recipients },
-                                    Message={ "Body": { "Text": { "Charset": charset, "Data": body } },
-                                              "Subject": { "Charset": charset, "Data": subject } },
-                                    Source=sender)
-        if "MessageId" in res:
-            app.config["Config"]["logger"].info("Notification sent successfully: {}".format(res["MessageId"]))
-        else:
-            app.config["Config"]["logger"].warning("Notification may not have been sent: {}".format(res))
+        app.config["Config"]["logger"].debug("Queueing notification to: %s", recipients)
+        emailOutbox.enqueue(sender, recipients, subject, body)
     except Exception as e:
-        app.config["Config"]["logger"].error(f"Error sending email to {recipients}: {e}")
+        app.config["Config"]["logger"].error("Error queueing email to %s: %s", recipients, e)
+# version of the chat history format written to s3 (legacy objects are a bare list of messages)
+CHAT_FORMAT_VERSION = 2
+# chat history object versions this app can read (legacy objects are just the list of messages)
+SUPPORTED_CHAT_FORMAT_VERSIONS = (2,)
+# define function to convert json to compact bytes (use orjson when it is installed)
+def json_dumps(obj):
+    if orjson:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+# define function to convert compact bytes/str to json
+def json_loads(data):
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
 # define function to convert s3 object to model format
 def chat_from_obj(chatObj):
-    app.config["Config"]["logger"].debug(f"Converting s3 object to model format")
+    app.config["Config"]["logger"].debug("Converting s3 object to model format")
     # convert s3 object to json
-    chatJson = json.loads(chatObj)
+    chatJson = json_loads(chatObj)
+    # unwrap versioned objects (legacy objects are just the list of messages)
+    if isinstance(chatJson, dict):
+        version = chatJson.get("version")
+        if version not in SUPPORTED_CHAT_FORMAT_VERSIONS:
+            raise ValueError(f"Unsupported chat history format version: {version} (supported: {SUPPORTED_CHAT_FORMAT_VERSIONS})")
+        chatJson = chatJson["history"]
     # convert json format into model format
     chatHistory = []
     for message in chatJson:
@@ -165,7 +205,7 @@ def chat_from_obj(chatObj):
     return chatHistory
 # define function to convert chat to s3 object
 def chat_to_obj(chatHistory):
-    app.config["Config"]["logger"].debug(f"Converting model format to s3 object")
+    app.config["Config"]["logger"].debug("Converting model format to s3 object")
     # convert model format into json format
     chatJson = []
     for message in chatHistory:
@@ -174,8 +214,8 @@ def chat_to_obj(chatHistory):
             "role": message.role,
             "parts": parts
         })
-    # convert json to object for s3
-    chatObj = json.dumps(chatJson)
+    # convert json to versioned object for s3
+    chatObj = json_dumps({"version": CHAT_FORMAT_VERSION, "history": chatJson})
     return chatObj
 # define function to cleanup idle chatbots
 def chatbot_cleanup():
@@ -191,13 +231,132 @@ def chatbot_cleanup():
                 app.config["Config"]["userChatbots"].pop(username, None)
                 app.config["Config"]["chatbotLastUsed"].pop(username, None)
                 app.config["Config"]["lastMessageTime"].pop(username, None)
-                app.config["Config"]["logger"].info(f"Removed inactive chatbot for user: {username}")
+                app.config["Config"]["logger"].info("Removed inactive chatbot for user: %s", username)
         sleep(1200)  # Run every 20 min
+# define function to add the indexes used by token lookups and cleanup
+def migrate_token_tables():
+    sqlClient = app.config["Config"]["sqlClient"]
+    for table in (app.config["Config"]["confirmTable"], app.config["Config"]["resetTable"]):
+        sqlClient.ensure_index(f"idx_{table}_token", ["token"], table)
+        sqlClient.ensure_index(f"idx_{table}_expiration", ["expiration"], table)
+# define function to purge expired tokens and abandoned signups in bounded batches
+def purge_expired_tokens(batchSize=500, pause=0.5):
+    sqlClient = app.config["Config"]["sqlClient"]
+    cutoff = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    purgedUsers = purgedConfirms = purgedResets = 0
+    # remove unconfirmed users whose confirmation link expired, then their tokens
+    while True:
+        expired = sqlClient.read_expired("expiration", cutoff, app.config["Config"]["confirmTable"], batchSize)
+        if not expired:
+            break
+        usernames = [row["username"] for row in expired]
+        purgedUsers += sqlClient.delete_in("username", usernames, {"confirmed": False}, app.config["Config"]["userTable"])
+        # delete the expired tokens of exactly the rows read above (by username, so odd tokens can't stall the loop)
+        deleted = sqlClient.delete_in("username", usernames, {}, app.config["Config"]["confirmTable"], expired=("expiration", cutoff))
+        purgedConfirms += deleted
+        # stop if nothing could be deleted, rather than re-reading the same batch forever
+        if not deleted:
+            app.config["Config"]["logger"].warning("Could not delete expired confirmation tokens, stopping purge")
+            break
+        # give other queries a chance between batches
+        sleep(pause)
+    # remove expired password reset tokens
+    while True:
+        deleted = sqlClient.delete_expired("expiration", cutoff, app.config["Config"]["resetTable"], batchSize)
+        purgedResets += deleted
+        if deleted < batchSize:
+            break
+        sleep(pause)
+    app.config["Config"]["logger"].info("Purged %s unconfirmed users, %s confirmation tokens and %s reset tokens", purgedUsers, purgedConfirms, purgedResets)
+# define function to run token maintenance periodically
+def token_maintenance():
+    try:
+        migrate_token_tables()
+    except Exception as e:
+        app.config["Config"]["logger"].error("Error migrating token tables: %s", e)
+    while True:
+        try:
+            purge_expired_tokens()
+        except Exception as e:
+            app.config["Config"]["logger"].error("Error purging expired tokens: %s", e)
+        sleep(3600)  # Run every hour
 # set up flask webapp
 app = Flask(__name__)
 app.config["Config"] = Config.configStore
 app.config["PERMANENT_SESSION_LIFETIME"] = timedelta(minutes=30) # time out session after 30 minutes
 app.secret_key = os.urandom(32)
+# load manifest of prebuilt front-end assets (written by buildAssets.py)
+assetDir = os.path.join(app.static_folder, "dist")
+try:
+    with open(os.path.join(assetDir, "manifest.json")) as f:
+        app.config["Config"]["assetManifest"] = json.load(f)
+except FileNotFoundError:
+    app.config["Config"]["logger"].warning("No asset manifest found, falling back to CDN assets. Run buildAssets.py to self-host them.")
+    app.config["Config"]["assetManifest"] = {}
+# define template helper to get the url of a prebuilt asset (None if it hasn't been built)
+@app.context_processor
+def inject_asset_url():
+    def asset_url(name):
+        hashedName = app.config["Config"]["assetManifest"].get(name)
+        return url_for("assets", filename=hashedName) if hashedName else None
+    return {"asset_url": asset_url}
+# set route for prebuilt assets
+@app.route("/assets/<path:filename>")
+def assets(filename):
+    # asset names are content-hashed so they can be cached forever
+    maxAge = 365*24*60*60
+    mimetype = mimetypes.guess_type(filename)[0]
+    # serve a precompressed copy if the browser accepts it
+    for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+        if encoding in request.accept_encodings and os.path.isfile(os.path.join(assetDir, filename + suffix)):
+            response = send_from_directory(assetDir, filename + suffix, mimetype=mimetype, conditional=True, max_age=maxAge)
+            response.headers["Content-Encoding"] = encoding
+            break
+    else:
+        response = send_from_directory(assetDir, filename, mimetype=mimetype, conditional=True, max_age=maxAge)
+    response.cache_control.immutable = True
+    response.vary.add("Accept-Encoding")
+    return response
+# start timing each request
+@app.before_request
+def start_request_timer():
+    g.requestStart = perf_counter()
+    g.requestSpans = requestSpans.set([])
+# record request duration and report where the time went
+@app.after_request
+def stop_request_timer(response):
+    if "requestStart" not in g:
+        return response
+    duration = perf_counter() - g.requestStart
+    app.config["Config"]["metrics"].observe("request_duration_seconds", duration, "Time spent handling requests",
+                                            endpoint=request.endpoint or "unknown", method=request.method, status=response.status_code)
+    spans = {}
+    for name, spanDuration in requestSpans.get() or []:
+        spans[name] = spans.get(name, 0) + spanDuration
+    requestSpans.reset(g.requestSpans)
+    # add spans to the Server-Timing header so they show up in browser dev tools
+    # (only for operators, since per-call timings leak e.g. whether a login username exists)
+    if not metrics_authorized() and not profiling_authorized():
+        return response
+    timings = [f"{name};dur={spanDuration * 1000:.1f}" for name, spanDuration in spans.items()]
+    timings.append(f"total;dur={duration * 1000:.1f}")
+    response.headers["Server-Timing"] = ", ".join(timings)
+    return response
+# start profiling the request if an admin asked for it
+@app.before_request
+def start_request_profile():
+    # skip all profiling work unless it is enabled and requested
+    if not app.config["Config"]["profiler"].enabled() or "X-Profile" not in request.headers:
+        return
+    if app.config["Config"]["profiler"].authorized(request.headers.get("X-Profile-Token")):
+        g.profile = app.config["Config"]["profiler"].start_request()
+# save the request profile and tell the admin where to find it
+@app.after_request
+def stop_request_profile(response):
+    if g.get("profile"):
+        profileId = app.config["Config"]["profiler"].finish_request(g.pop("profile"))
+        response.headers["X-Profile-Id"] = profileId
+    return response
 # set route for landing page
 @app.route("/")
 def index():
@@ -221,7 +380,11 @@ def login():
         # check that the username/password is a valid login
         user = next((u for u in users if u["username"] == username), None)
         # error if username or password is incorrect
-        if not (user and bcrypt.checkpw(password.encode(), user["password"].encode())):
+        validLogin = False
+        if user:
+            with app.config["Config"]["metrics"].span("bcrypt.checkpw"):
+                validLogin = bcrypt.checkpw(password.encode(), user["password"].encode())
+        if not validLogin:
             errorMessage = "Invalid username or password"
         # error if user email has not been confirmed
         elif not user["confirmed"]:
@@ -229,7 +392,7 @@ def login():
         # if there is an error,
         if errorMessage:
             # stay on the login page and display error
-            app.config["Config"]["logger"].warning(f"Failed login attempt for user: {username}")
+            app.config["Config"]["logger"].warning("Failed login attempt for user: %s", username)
             return render_template("login.html", error=errorMessage)
         # otherwise, it is a successful login
         else:
@@ -238,7 +401,7 @@ def login():
             # session expires if browser is closed
             session.permanent = True
             # redirect to the chat
-            app.config["Config"]["logger"].info(f"User {username} logged in.")
+            app.config["Config"]["logger"].info("User %s logged in.", username)
             return redirect(url_for("select_chat"))
     # render the login page
     error = request.args.get("error")
@@ -254,7 +417,7 @@ def login():
 def logout():
     username = session.get("username")
     if username:
-        app.config["Config"]["logger"].info(f"User {username} logged out.")
+        app.config["Config"]["logger"].info("User %s logged out.", username)
         # delete chatbot
         with app.config["Config"]["chatbotsLock"]:
             app.config["Config"]["userChatbots"].pop(username, None)
@@ -293,7 +456,7 @@ def signup():
             errorMessage = "Emails do not match"
         # if there's an error
         if errorMessage:
-            app.config["Config"]["logger"].warning(f"Failed signup attempt for user: {newUsername}")
+            app.config["Config"]["logger"].warning("Failed signup attempt for user: %s", newUsername)
             # stay on the signup page and display error
             return render_template("signup.html", error=errorMessage)
         # if no error,
@@ -301,7 +464,8 @@ def signup():
             # generate salt to encrypt password
             salt = bcrypt.gensalt()
             # encrypt password
-            hashedPassword = bcrypt.hashpw(newPassword.encode(), salt)
+            with app.config["Config"]["metrics"].span("bcrypt.hashpw"):
+                hashedPassword = bcrypt.hashpw(newPassword.encode(), salt)
             # generate a confirmation token
             token = secrets.token_urlsafe(32)
             # and set its expiration date
@@ -338,8 +502,8 @@ def signup():
                 Best regards,  
                 IX Cloud Security Team
             """
-            send_email(app.config["Config"]["sesClient"], sender, recipient, subject, body)
-            app.config["Config"]["logger"].info(f"User {newUsername} signed up.")
+            send_email(app.config["Config"]["emailOutbox"], sender, recipient, subject, body)
+            app.config["Config"]["logger"].info("User %s signed up.", newUsername)
             # render signup page success page
             return render_template("signup_success.html")
     # render signup page
@@ -349,13 +513,13 @@ def signup():
 def confirm_email():
     # get token from url
     token = request.args.get("token")
-    # get confirmation tokens from rds
-    confirmTokens = app.config["Config"]["sqlClient"].read_table(app.config["Config"]["confirmTable"])
-    # check that the reset token exists
-    tokenEntry = next((row for row in confirmTokens if row["token"] == token), None)
+    # look up the confirmation token in rds
+    confirmTokens = app.config["Config"]["sqlClient"].read_entries({"token": token}, app.config["Config"]["confirmTable"]) if token else []
+    # check that the confirmation token exists
+    tokenEntry = confirmTokens[0] if confirmTokens else None
     # error if no token is in the url or it doesn't exist in the table or if the token is expired
     if not token or not tokenEntry or datetime.now() > tokenEntry["expiration"]:
-        app.config["Config"]["logger"].warning(f"Failed email confirmation attempt for user: {tokenEntry['username']}")
+        app.config["Config"]["logger"].warning("Failed email confirmation attempt for user: %s", tokenEntry["username"] if tokenEntry else None)
         # redirect to login page and display error
         return redirect(url_for("login", error="confirm_expired"))
     # format user information into dict with sql columns as keys
@@ -366,7 +530,7 @@ def confirm_email():
     app.config["Config"]["sqlClient"].update_entry(userUpdateValue, userUpdateFilter, app.config["Config"]["userTable"])
     # delete the token after successful reset
     app.config["Config"]["sqlClient"].delete_entry(resetDeleteFilter, app.config["Config"]["confirmTable"])
-    app.config["Config"]["logger"].info(f"User {tokenEntry['username']} confirmed email")
+    app.config["Config"]["logger"].info("User %s confirmed email", tokenEntry['username'])
     # render success page
     return render_template("confirm_email_success.html")
 # set route for forgot password page
@@ -416,14 +580,14 @@ def forgot_password():
                 Best regards,  
                 IX Cloud Security Team
             """
-            send_email(app.config["Config"]["sesClient"], sender, recipient, subject, body)
+            send_email(app.config["Config"]["emailOutbox"], sender, recipient, subject, body)
             # render forgot password success page
-            app.config["Config"]["logger"].info(f"User {matchedUser['username']} requested password reset.")
+            app.config["Config"]["logger"].info("User %s requested password reset.", matchedUser['username'])
             return render_template("forgot_password_success.html", email=email)
         # if it does not,
         else:
             # stay on forgot password page and display error
-            app.config["Config"]["logger"].warning(f"Failed password reset request for user: {matchedUser['username']}")
+            app.config["Config"]["logger"].warning("Failed password reset request for user: %s", matchedUser['username'])
             return render_template("forgot_password.html", error="Email not found")
     # render forgot password page
     return render_template("forgot_password.html")
@@ -432,13 +596,13 @@ def forgot_password():
 def reset_password():
     # get token from url
     token = request.args.get("token")
-    # get reset tokens from rds
-    resetTokens = app.config["Config"]["sqlClient"].read_table(app.config["Config"]["resetTable"])
+    # look up the reset token in rds
+    resetTokens = app.config["Config"]["sqlClient"].read_entries({"token": token}, app.config["Config"]["resetTable"]) if token else []
     # check that the reset token exists
-    tokenEntry = next((row for row in resetTokens if row["token"] == token), None)
+    tokenEntry = resetTokens[0] if resetTokens else None
     # error if no token is in the url or it doesn't exist in the table or if the token is expired
     if not token or not tokenEntry or datetime.now() > tokenEntry["expiration"]:
-        app.config["Config"]["logger"].warning(f"Failed password reset attempt for user: {tokenEntry['username']}")
+        app.config["Config"]["logger"].warning("Failed password reset attempt for user: %s", tokenEntry["username"] if tokenEntry else None)
         # redirect to login page and display error
         return redirect(url_for("login", error="reset_expired"))
     # if no error,
@@ -463,7 +627,8 @@ def reset_password():
             # generate salt to encrypt password
             salt = bcrypt.gensalt()
             # encrypt password
-            hashedPassword = bcrypt.hashpw(newPassword.encode(), salt)
+            with app.config["Config"]["metrics"].span("bcrypt.hashpw"):
+                hashedPassword = bcrypt.hashpw(newPassword.encode(), salt)
             # format reset information into dict with sql columns as keys
             userUpdateValue = {"password": hashedPassword}
             userUpdateFilter = {"username": tokenEntry["username"]}
@@ -472,7 +637,7 @@ def reset_password():
             app.config["Config"]["sqlClient"].update_entry(userUpdateValue, userUpdateFilter, app.config["Config"]["userTable"])
             # delete the token after successful reset
             app.config["Config"]["sqlClient"].delete_entry(resetDeleteFiler, app.config["Config"]["resetTable"])
-            app.config["Config"]["logger"].info(f"User {tokenEntry['username']} reset password.")
+            app.config["Config"]["logger"].info("User %s reset password.", tokenEntry['username'])
             # render success page
             return render_template("reset_password_success.html")
     # render reset password page
@@ -497,25 +662,28 @@ def change_password():
         # check for errors
         errorMessage = None
         # error if the current password is incorrect
-        if not bcrypt.checkpw(oldPassword.encode(), user["password"].encode()):
+        with app.config["Config"]["metrics"].span("bcrypt.checkpw"):
+            validPassword = bcrypt.checkpw(oldPassword.encode(), user["password"].encode())
+        if not validPassword:
             errorMessage = "Incorrect current password."
         # error if the email confirmation does not match
         if newPassword != confirmPassword:
             errorMessage = "Passwords do not match"
         if errorMessage:
-            app.config["Config"]["logger"].warning(f"Failed password change attempt for user: {username}")
+            app.config["Config"]["logger"].warning("Failed password change attempt for user: %s", username)
             return render_template('change_password.html', error=errorMessage)
         else:
             # generate salt to encrypt password
             salt = bcrypt.gensalt()
             # encrypt password
-            hashedPassword = bcrypt.hashpw(newPassword.encode(), salt)
+            with app.config["Config"]["metrics"].span("bcrypt.hashpw"):
+                hashedPassword = bcrypt.hashpw(newPassword.encode(), salt)
             # format change information into dict with sql columns as keys
             userUpdateValue  = {"password": hashedPassword}
             userUpdateFilter = {"username": username}
             # update password for user in db
             app.config["Config"]["sqlClient"].update_entry(userUpdateValue, userUpdateFilter, app.config["Config"]["userTable"])
-            app.config["Config"]["logger"].info(f"User {username} changed password.")
+            app.config["Config"]["logger"].info("User %s changed password.", username)
             # redirect to login page
             return redirect(url_for("select_chat"))
     return render_template("change_password.html")
@@ -545,16 +713,20 @@ def start_chat():
         history = []
         if choice=="continue":
             try:
-                if app.config["Config"]["s3Client"].obj_lookup(s3Key):
-                    app.config["Config"]["logger"].info(f"User {username} is continuing an old chat.")
-                    chatObj = app.config["Config"]["s3Client"].obj_read(s3Key)
-                    history = chat_from_obj(chatObj)
+                # fetch the chat history in one request (served from cache if unchanged)
+                chatObj = app.config["Config"]["s3Client"].obj_fetch(s3Key)
+                if chatObj is not None:
+                    app.config["Config"]["logger"].info("User %s is continuing an old chat.", username)
+                    with app.config["Config"]["metrics"].span("chat_from_obj"):
+                        history = chat_from_obj(chatObj)
                 else:
-                    app.config["Config"]["logger"].info(f"No previous chat found for {username}. Starting fresh.")
+                    app.config["Config"]["logger"].info("No previous chat found for %s. Starting fresh.", username)
             except Exception as e:
-                app.config["Config"]["logger"].warning(f"Failed to load chat history for {username}: {e}")
+                # don't start a chatbot here, since its first /send would overwrite the stored history
+                app.config["Config"]["logger"].error("Failed to load chat history for %s: %s", username, e)
+                return render_template("select_chat.html", error="Your previous chat could not be loaded. Please try again later."), 500
         else:
-            app.config["Config"]["logger"].info(f"User {username} has started a new chat.")
+            app.config["Config"]["logger"].info("User %s has started a new chat.", username)
         # create a chatbot        
         app.config["Config"]["userChatbots"][username] = app.config["Config"]["genaiClient"].chats.create(
             model=app.config["Config"]["geminiModel"],
@@ -575,6 +747,32 @@ def chat():
     username = session["username"]
     # render chat page
     return render_template("chat.html", username=username)
+# set backend for loading chat history in pages
+@app.route("/history")
+def history():
+    # check for user's chatbot
+    username = session.get("username")
+    if not username or username not in app.config["Config"]["userChatbots"]:
+        return jsonify({"error": "Chat session has expired."}), 403
+    # load chatbot
+    chatbot = app.config["Config"]["userChatbots"][username]
+    # get page size and cursor (index of the oldest message already shown)
+    maxLimit = 100
+    limit = max(1, min(request.args.get("limit", 20, type=int), maxLimit))
+    cursor = request.args.get("cursor", type=int)
+    # the chatbot holds the history loaded in start_chat plus any new turns, so no s3 read is needed
+    chatHistory = chatbot.get_history()
+    end = len(chatHistory) if cursor is None else max(0, min(cursor, len(chatHistory)))
+    start = max(0, end - limit)
+    # convert the page into json format, newest first
+    messages = []
+    for message in reversed(chatHistory[start:end]):
+        messages.append({
+            "role": message.role,
+            "text": "".join(part.text or "" for part in message.parts or [])
+        })
+    # return the page and the cursor for the next (older) page
+    return jsonify({"messages": messages, "cursor": start if start > 0 else None})
 # set backend for sending messages to gemini
 @app.route("/send", methods=["POST"])
 def send_message():
@@ -588,7 +786,7 @@ def send_message():
     data = request.get_json()
     # extract message
     userInput = data.get("message", "").strip()
-    app.config["Config"]["logger"].debug(f"User {username} sent message: {userInput}")
+    app.config["Config"]["logger"].debug("User %s sent message: %s", username, userInput)
     # Reject empty messages
     if not userInput:
         return jsonify({"error": "Empty message"}), 400
@@ -607,32 +805,100 @@ def send_message():
     app.config["Config"]["chatbotLastUsed"][username] = now
     try:
         # if there is a message, try to send the message to chatbot
-        response = chatbot.send_message(userInput)
-        app.config["Config"]["logger"].debug(f"Model response for {username}: {response.text}")
+        with app.config["Config"]["metrics"].span("genai.send_message"):
+            response = chatbot.send_message(userInput)
+        app.config["Config"]["metrics"].record_usage(getattr(response, "usage_metadata", None), app.config["Config"]["geminiModel"])
+        responseText = response.text
+        app.config["Config"]["logger"].debug("Model response for %s: %s", username, responseText)
         # write updated chat history to s3
         chatKey = f"chat-history/{username}.json"
         chatHistory = chatbot.get_history()
-        chatObj = chat_to_obj(chatHistory)
-        app.config["Config"]["s3Client"].obj_write(chatKey, chatObj, "application/json")
+        with app.config["Config"]["metrics"].span("chat_to_obj"):
+            chatObj = chat_to_obj(chatHistory)
+        app.config["Config"]["s3Client"].obj_write(chatKey, chatObj, "application/json", compress=True)
         # return the response
-        return jsonify({"response": response.text})
+        return jsonify({"response": responseText})
     # if there is an error while handling the message,
     except Exception as e:
-        app.config["Config"]["logger"].error(f"Error processing message for {username}: {e}", exc_info=True)
+        app.config["Config"]["logger"].error("Error processing message for %s: %s", username, e, exc_info=True)
         # return the error
         return jsonify({"error": str(e)}), 500
 # create a global error handler
 @app.errorhandler(Exception)
 def handle_exception(e):
+    # pass http errors through (e.g. a 404 for an asset from an old build)
+    if isinstance(e, HTTPException):
+        return e
     app.config["Config"]["logger"].error("Unhandled exception occurred", exc_info=True)
     return jsonify({"error": "An internal server error occurred"}), 500
+# define function to check access to metrics (METRICSTOKEN must be set and sent as a bearer token)
+def metrics_authorized():
+    metricsToken = os.environ.get("METRICSTOKEN", None)
+    authHeader = request.headers.get("Authorization", "")
+    return bool(metricsToken) and secrets.compare_digest(authHeader, f"Bearer {metricsToken}")
+# set route for prometheus metrics (hidden when not authorized)
+@app.route("/metrics")
+def metrics():
+    if not metrics_authorized():
+        return jsonify({"error": "Not found"}), 404
+    return Response(app.config["Config"]["metrics"].render(), mimetype="text/plain; version=0.0.4")
+# define function to check admin access to profiling (hidden when not authorized)
+def profiling_authorized():
+    return app.config["Config"]["profiler"].authorized(request.headers.get("X-Profile-Token"))
+# set route for saved request profiles
+@app.route("/admin/profile/<profileId>")
+def admin_profile(profileId):
+    if not profiling_authorized():
+        return jsonify({"error": "Not found"}), 404
+    raw = request.args.get("format") == "pstats"
+    profile = app.config["Config"]["profiler"].get_profile(profileId, raw=raw)
+    if profile is None:
+        return jsonify({"error": "Profile not found"}), 404
+    # raw dumps can be opened with pstats/snakeviz
+    if raw:
+        return Response(profile, mimetype="application/octet-stream", headers={"Content-Disposition": f"attachment; filename={profileId}.prof"})
+    return Response(profile, mimetype="text/plain")
+# set route for sampling all threads for a while
+@app.route("/admin/sample")
+def admin_sample():
+    if not profiling_authorized():
+        return jsonify({"error": "Not found"}), 404
+    # limit sampling so it can't tie up a worker for long
+    maxSeconds = 60
+    seconds = max(0.1, min(request.args.get("seconds", 10, type=float), maxSeconds))
+    interval = max(0.001, request.args.get("interval", 0.005, type=float))
+    app.config["Config"]["logger"].info("Sampling stacks for %ss", seconds)
+    return Response(app.config["Config"]["profiler"].sample(seconds, interval), mimetype="text/plain")
+# set route for dumping thread stacks and lock waits
+@app.route("/admin/threads")
+def admin_threads():
+    if not profiling_authorized():
+        return jsonify({"error": "Not found"}), 404
+    locks = [lock for lock in [app.config["Config"]["chatbotsLock"]] if isinstance(lock, TimedLock)]
+    return Response(app.config["Config"]["profiler"].dump_threads(locks), mimetype="text/plain")
 @app.route("/ping")
 def ping():
     return "pong"
 
-if __name__ == "__main__":
+# start background threads once per process, on the first request it serves (python, flask run or wsgi),
+# so importing the module (e.g. flask routes or a preloading wsgi master, whose forked workers start their own) doesn't start them
+backgroundLock = Lock()
+@app.before_request
+def start_background_threads():
+    if app.config["Config"].get("backgroundStarted"):
+        return
+    with backgroundLock:
+        if app.config["Config"].get("backgroundStarted"):
+            return
+        app.config["Config"]["backgroundStarted"] = True
     # Start background thread for cleaning up inactive chatbots
     Thread(target=chatbot_cleanup, daemon=True).start()
+    # Start background thread for sending queued emails
+    Thread(target=app.config["Config"]["emailOutbox"].drain, daemon=True).start()
+    # Start background thread for purging expired tokens
+    Thread(target=token_maintenance, daemon=True).start()
+
+if __name__ == "__main__":
     # Start webapp
     app.config["Config"]["logger"].info("Starting Flask app on http://127.0.0.1:5000")
     app.run()
\ No newline at end of file
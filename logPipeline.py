@@ -0,0 +1,81 @@
+import logging
+import logging.handlers
+import os
+import copy
+import sys
+import json
+import queue
+import atexit
+import random
+# log format used for plain text output
+logFormat = "%(asctime)-11s [%(levelname)s] %(message)s (%(name)s:%(lineno)d)"
+# define a formatter that writes one json object per line
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "message": record.getMessage(),
+            "logger": record.name,
+            "line": record.lineno,
+            "thread": record.threadName,
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+# define a queue handler that keeps the traceback separate from the message (so json output can put it in its own field)
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # merge args into the message now, like the stdlib handler, so it shows the values at call time
+        # (the stdlib handler also folds the traceback into the message, which hides it from the json formatter)
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        # render the traceback to text since traceback objects shouldn't outlive the request
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+# define a filter that keeps only a fraction of debug records
+class DebugSampler(logging.Filter):
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or self.rate >= 1 or random.random() < self.rate
+# listener thread that writes queued records (None until logging is set up)
+listener = None
+# define function to send all logging through a queue drained by a background thread
+def setup_logging(level=logging.INFO):
+    global listener
+    if listener:
+        return listener
+    # read logging settings from the environment
+    envLevel = os.environ.get("LOGLEVEL", None)
+    if envLevel:
+        # accept any case (e.g. debug) and ignore unknown level names
+        envLevel = logging.getLevelName(envLevel.upper())
+        if isinstance(envLevel, int):
+            level = envLevel
+    jsonOutput = os.environ.get("LOGFORMAT", None) == "json"
+    sampleRate = float(os.environ.get("LOGDEBUGSAMPLE", 1)) # fraction of debug records kept
+    # the listener does the formatting and the writes to stderr
+    streamHandler = logging.StreamHandler(sys.stderr)
+    streamHandler.setFormatter(JsonFormatter() if jsonOutput else logging.Formatter(logFormat))
+    # request threads only put records on the queue
+    logQueue = queue.SimpleQueue()
+    queueHandler = DeferredQueueHandler(logQueue)
+    queueHandler.addFilter(DebugSampler(sampleRate))
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queueHandler)
+    root.setLevel(level)
+    # start the listener and flush the queue on exit
+    listener = logging.handlers.QueueListener(logQueue, streamHandler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,72 @@
+import logging
+logger = logging.getLogger(__name__)
+
+import re
+import json
+import math
+import hashlib
+from datetime import datetime
+# define a per-user index of extracted memories used to drop duplicates before ingestion
+class MyMemoryIndex:
+    def __init__(self, s3Client, genaiClient, embedModel, user, threshold=0.92):
+        # save clients and index settings
+        self.s3Client = s3Client
+        self.genaiClient = genaiClient
+        self.embedModel = embedModel
+        self.user = user
+        self.threshold = threshold # cosine similarity above which a memory counts as a near-duplicate
+        self.key = f"memory-index/{user}.json"
+        # load the user's index from s3 (or start a new one)
+        indexObj = self.s3Client.obj_fetch(self.key)
+        index = json.loads(indexObj) if indexObj else {}
+        self.entries = index.get("entries", []) # unique memories with their content hash and embedding
+        self.hashes = set(index.get("hashes", [])) # content hashes of every memory seen (including dropped ones)
+        self.processed = index.get("processed", {"count": 0, "hash": None}) # chat history prefix already summarized
+        logger.debug("MyMemoryIndex loaded %s memories for user: %s", len(self.entries), user)
+    def content_hash(self, text):
+        # normalize case, punctuation and whitespace so trivial rewordings hash the same
+        normalized = " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+    def embed(self, text):
+        response = self.genaiClient.models.embed_content(model=self.embedModel, contents=text)
+        return response.embeddings[0].values
+    def similarity(self, a, b):
+        dot = sum(x * y for x, y in zip(a, b))
+        norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+        return dot / norm if norm else 0.0
+    def add(self, text):
+        # drop exact duplicates without calling the embedding model
+        contentHash = self.content_hash(text)
+        if contentHash in self.hashes:
+            logger.debug("Dropping duplicate memory for user: %s", self.user)
+            return False
+        self.hashes.add(contentHash)
+        # drop memories that are too similar to one already in the index
+        embedding = self.embed(text)
+        bestMatch = max((self.similarity(embedding, entry["embedding"]) for entry in self.entries), default=0.0)
+        if bestMatch >= self.threshold:
+            logger.debug("Dropping near-duplicate memory for user %s (similarity %.3f)", self.user, bestMatch)
+            return False
+        # otherwise, keep it
+        self.entries.append({
+            "hash": contentHash,
+            "text": text,
+            "embedding": [round(value, 6) for value in embedding],
+            "created": datetime.now().isoformat(),
+        })
+        return True
+    def unprocessed(self, chatJson):
+        # skip the part of the chat history that was summarized on a previous run
+        count = self.processed["count"]
+        if count and count <= len(chatJson) and self.history_hash(chatJson[:count]) == self.processed["hash"]:
+            return chatJson[count:]
+        # the history was replaced (e.g. a new chat was started), so summarize all of it
+        return chatJson
+    def mark_processed(self, chatJson):
+        self.processed = {"count": len(chatJson), "hash": self.history_hash(chatJson)}
+    def history_hash(self, chatJson):
+        return hashlib.sha256(json.dumps(chatJson, sort_keys=True).encode("utf-8")).hexdigest()
+    def save(self):
+        index = {"entries": self.entries, "hashes": sorted(self.hashes), "processed": self.processed}
+        self.s3Client.obj_write(self.key, json.dumps(index, separators=(",", ":")), "application/json", compress=True)
+        logger.debug("Saved %s memories to index for user: %s", len(self.entries), self.user)
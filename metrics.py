@@ -0,0 +1,114 @@
+import logging
+logger = logging.getLogger(__name__)
+
+import os
+from time import perf_counter
+from threading import Lock
+from contextlib import contextmanager
+from contextvars import ContextVar
+try:
+    from opentelemetry import trace
+except ImportError:
+    trace = None
+# spans recorded during the current request (None outside of a request)
+requestSpans = ContextVar("requestSpans", default=None)
+# define a metrics registry with prometheus-style histograms and counters
+class MyMetrics:
+    def __init__(self, prefix="genai", buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)):
+        self.prefix = prefix
+        self.buckets = buckets
+        self.histograms = dict() # (name, labels) -> [bucket counts, sum, count]
+        self.counters = dict() # (name, labels) -> value
+        self.help = dict() # name -> (type, help text)
+        self.lock = Lock()
+        # export spans to opentelemetry when it is installed and enabled
+        self.tracer = None
+        if os.environ.get("OTELENABLED", None) and trace:
+            self.tracer = trace.get_tracer(prefix)
+            logger.info("Exporting spans to OpenTelemetry")
+        logger.debug("MyMetrics initialized with prefix: %s", prefix)
+    def observe(self, name, value, helpText="", **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.help.setdefault(name, ("histogram", helpText))
+            entry = self.histograms.get(key)
+            if entry is None:
+                entry = self.histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+    def increment(self, name, value=1, helpText="", **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.help.setdefault(name, ("counter", helpText))
+            self.counters[key] = self.counters.get(key, 0) + value
+    @contextmanager
+    def span(self, name, **attributes):
+        # time the block and record it in the span histogram (and the current request, if any)
+        otelSpan = self.tracer.start_as_current_span(name, attributes=attributes) if self.tracer else None
+        if otelSpan:
+            otelSpan.__enter__()
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            duration = perf_counter() - start
+            if otelSpan:
+                otelSpan.__exit__(None, None, None)
+            self.observe("span_duration_seconds", duration, "Time spent in instrumented calls", span=name)
+            spans = requestSpans.get()
+            if spans is not None:
+                spans.append((name, duration))
+    def record_usage(self, usage, model):
+        # count tokens from genai usage metadata
+        if usage is None:
+            return
+        for tokenType, field in (("prompt", "prompt_token_count"), ("response", "candidates_token_count")):
+            count = getattr(usage, field, None)
+            if count:
+                self.increment("tokens_total", count, "Tokens used by genai calls", model=model, type=tokenType)
+    def format_labels(self, labels, extra=()):
+        labels = tuple(labels) + tuple(extra)
+        if not labels:
+            return ""
+        escape = lambda v: str(v).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in labels) + "}"
+    def render(self):
+        # render all metrics in prometheus text exposition format
+        lines = []
+        with self.lock:
+            for name, (metricType, helpText) in sorted(self.help.items()):
+                fullName = f"{self.prefix}_{name}"
+                lines.append(f"# HELP {fullName} {helpText}")
+                lines.append(f"# TYPE {fullName} {metricType}")
+                if metricType == "histogram":
+                    for (entryName, labels), (bucketCounts, total, count) in sorted(self.histograms.items()):
+                        if entryName != name:
+                            continue
+                        for bound, bucketCount in zip(self.buckets, bucketCounts):
+                            lines.append(f"{fullName}_bucket{self.format_labels(labels, [('le', bound)])} {bucketCount}")
+                        lines.append(f"{fullName}_bucket{self.format_labels(labels, [('le', '+Inf')])} {count}")
+                        lines.append(f"{fullName}_sum{self.format_labels(labels)} {total}")
+                        lines.append(f"{fullName}_count{self.format_labels(labels)} {count}")
+                else:
+                    for (entryName, labels), value in sorted(self.counters.items()):
+                        if entryName == name:
+                            lines.append(f"{fullName}{self.format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+# define a wrapper that times every method call on a client
+class InstrumentedClient:
+    def __init__(self, client, name, metrics):
+        self._client = client
+        self._name = name
+        self._metrics = metrics
+    def __getattr__(self, attr):
+        value = getattr(self._client, attr)
+        # only wrap public methods (attributes and helpers are passed through)
+        if not callable(value) or attr.startswith("_"):
+            return value
+        def timed(*args, **kwargs):
+            with self._metrics.span(f"{self._name}.{attr}"):
+                return value(*args, **kwargs)
+        return timed
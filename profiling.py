@@ -0,0 +1,128 @@
+import logging
+logger = logging.getLogger(__name__)
+
+import io
+import sys
+import marshal
+import pstats
+import cProfile
+import secrets
+import threading
+import traceback
+from time import perf_counter, sleep, time
+from threading import Lock, get_ident
+from collections import OrderedDict
+# define a lock wrapper that tracks its holder and waiting threads
+class TimedLock:
+    def __init__(self, name, lock=None, metrics=None):
+        self.name = name
+        self.lock = lock or Lock()
+        self.metrics = metrics
+        self.holder = None # (thread id, acquired at)
+        self.waiters = dict() # thread id -> waiting since
+    def acquire(self, blocking=True, timeout=-1):
+        threadId = get_ident()
+        start = perf_counter()
+        self.waiters[threadId] = time()
+        try:
+            acquired = self.lock.acquire(blocking, timeout)
+        finally:
+            self.waiters.pop(threadId, None)
+        if acquired:
+            self.holder = (threadId, time())
+            if self.metrics:
+                self.metrics.observe("lock_wait_seconds", perf_counter() - start, "Time spent waiting for locks", lock=self.name)
+        return acquired
+    def release(self):
+        self.holder = None
+        self.lock.release()
+    def locked(self):
+        return self.lock.locked()
+    def __enter__(self):
+        self.acquire()
+        return self
+    def __exit__(self, *args):
+        self.release()
+# define a store for on-demand profiles of live workers
+class MyProfiler:
+    def __init__(self, token, keep=20):
+        # profiling is disabled unless an admin token is configured
+        self.token = token
+        self.profiles = OrderedDict() # profile id -> pstats marshal dump
+        self.keep = keep # number of request profiles kept in memory
+        self.lock = Lock()
+        logger.debug("MyProfiler initialized (enabled: %s)", bool(token))
+    def enabled(self):
+        return bool(self.token)
+    def authorized(self, token):
+        return self.enabled() and bool(token) and secrets.compare_digest(token, self.token)
+    def start_request(self):
+        profile = cProfile.Profile()
+        # only one profiler can be active at a time on some python versions
+        try:
+            profile.enable()
+        except ValueError as e:
+            logger.warning("Could not start request profile: %s", e)
+            return None
+        return profile
+    def finish_request(self, profile):
+        profile.disable()
+        profile.create_stats()
+        profileId = secrets.token_hex(8)
+        with self.lock:
+            self.profiles[profileId] = marshal.dumps(profile.stats)
+            while len(self.profiles) > self.keep:
+                self.profiles.popitem(last=False)
+        return profileId
+    def get_profile(self, profileId, raw=False, limit=50):
+        with self.lock:
+            data = self.profiles.get(profileId)
+        if data is None or raw:
+            return data
+        # render the profile as text sorted by cumulative time
+        stats = pstats.Stats(self.load_stats(data), stream=io.StringIO())
+        stats.sort_stats("cumulative").print_stats(limit)
+        return stats.stream.getvalue()
+    def load_stats(self, data):
+        # build a minimal object pstats can load a marshal dump from
+        holder = type("StatsHolder", (), {})()
+        holder.stats = marshal.loads(data)
+        holder.create_stats = lambda: None
+        return holder
+    def sample(self, seconds, interval=0.005):
+        # sample every other thread's stack and fold them into flamegraph collapsed-stack format
+        ownThread = get_ident()
+        counts = dict()
+        deadline = perf_counter() + seconds
+        while perf_counter() < deadline:
+            for threadId, frame in sys._current_frames().items():
+                if threadId == ownThread:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                key = ";".join(reversed(stack))
+                counts[key] = counts.get(key, 0) + 1
+            sleep(interval)
+        return "\n".join(f"{stack} {count}" for stack, count in sorted(counts.items())) + "\n"
+    def dump_threads(self, locks=()):
+        # dump every thread's stack plus the holder and waiters of each tracked lock
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        now = time()
+        lines = []
+        for lock in locks:
+            holder = lock.holder
+            if holder:
+                lines.append(f"Lock {lock.name}: held by {names.get(holder[0], holder[0])} for {now - holder[1]:.3f}s")
+            else:
+                lines.append(f"Lock {lock.name}: free")
+            for threadId, since in list(lock.waiters.items()):
+                lines.append(f"  waiting: {names.get(threadId, threadId)} for {now - since:.3f}s")
+        lines.append("")
+        for threadId, frame in sys._current_frames().items():
+            lines.append(f"Thread {names.get(threadId, threadId)} ({threadId}):")
+            lines.extend(line.rstrip("\n") for line in traceback.format_stack(frame))
+            lines.append("")
+        return "\n".join(lines)
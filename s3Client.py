@@ -1,57 +1,151 @@
 import logging
 logger = logging.getLogger(__name__)
 
+import gzip
+from collections import OrderedDict
+from threading import Lock
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 # define an s3 class
 class MyS3Client:
-    def __init__(self, session, bucket):
+    def __init__(self, session, bucket, cacheSize=64*1024*1024):
         # save the bucket name
         self.bucket = bucket
         # create an s3 client
         self.s3 = session.client("s3")
-        logger.debug(f"MyS3Client initialized for bucket: {bucket}")
+        # set up a bounded lru cache of decoded objects keyed by s3 key (entries are (etag, data))
+        self.cache = OrderedDict()
+        self.cacheSize = cacheSize # max number of characters held in the cache
+        self.cacheUsed = 0
+        self.cacheLock = Lock()
+        logger.debug("MyS3Client initialized for bucket: %s", bucket)
     def obj_read(self, key):
-        logger.debug(f"Attempting to read S3 object with key: {key}")
+        logger.debug("Attempting to read S3 object with key: %s", key)
         # try to retrieve the object
         try:
             response = self.s3.get_object(Bucket=self.bucket, Key=key)
-            data = response["Body"].read().decode("utf-8")
-            logger.debug(f"Successfully read S3 object with key: {key}")
+            data = self.decompress(response["Body"].read(), response.get("ContentEncoding")).decode("utf-8")
+            logger.debug("Successfully read S3 object with key: %s", key)
             # return the decoded object
             return data
         except Exception as e:
-            logger.error(f"Error reading S3 object with key {key}: {e}", exc_info=True)
+            logger.error("Error reading S3 object with key %s: %s", key, e, exc_info=True)
             raise
-    def obj_write(self, key, obj, contentType):
-        logger.debug(f"Attempting to write S3 object with key: {key}")
+    def cache_get(self, key):
+        with self.cacheLock:
+            entry = self.cache.get(key)
+            if entry:
+                self.cache.move_to_end(key)
+            return entry
+    def cache_put(self, key, etag, data):
+        with self.cacheLock:
+            # replace any existing entry for the key
+            self.cache_drop(key)
+            # don't cache objects that would take up the whole cache
+            if not etag or len(data) > self.cacheSize:
+                return
+            self.cache[key] = (etag, data)
+            self.cacheUsed += len(data)
+            # evict least recently used objects until the cache is back under its size limit
+            while self.cacheUsed > self.cacheSize:
+                _, (_, oldData) = self.cache.popitem(last=False)
+                self.cacheUsed -= len(oldData)
+    def cache_drop(self, key):
+        entry = self.cache.pop(key, None)
+        if entry:
+            self.cacheUsed -= len(entry[1])
+    def compress(self, body, contentEncoding):
+        # compress the body with the requested content encoding
+        if contentEncoding == "zstd":
+            return zstandard.ZstdCompressor(level=3).compress(body)
+        elif contentEncoding == "gzip":
+            return gzip.compress(body, compresslevel=6)
+        return body
+    def decompress(self, body, contentEncoding=None):
+        # decompress the body based on its content encoding (or magic bytes for objects missing the header)
+        if contentEncoding == "zstd" or body[:4] == b"\x28\xb5\x2f\xfd":
+            if zstandard is None:
+                raise RuntimeError("zstandard is required to read zstd-encoded objects")
+            return zstandard.ZstdDecompressor().decompressobj().decompress(body)
+        elif contentEncoding == "gzip" or body[:2] == b"\x1f\x8b":
+            return gzip.decompress(body)
+        # legacy objects are stored uncompressed
+        return body
+    def obj_write(self, key, obj, contentType, compress=False):
+        logger.debug("Attempting to write S3 object with key: %s", key)
         # try to upload the object
         try:
-            body = obj.encode("utf-8")
-            self.s3.put_object(Bucket=self.bucket, Key=key, Body=body, ContentType=contentType)
-            logger.debug(f"Successfully wrote S3 object with key: {key}")
+            body = obj.encode("utf-8") if isinstance(obj, str) else obj
+            extraArgs = {}
+            # compress the object (prefer zstd when it is installed)
+            if compress:
+                contentEncoding = "zstd" if zstandard else "gzip"
+                body = self.compress(body, contentEncoding)
+                extraArgs["ContentEncoding"] = contentEncoding
+            response = self.s3.put_object(Bucket=self.bucket, Key=key, Body=body, ContentType=contentType, **extraArgs)
+            # keep the cache in sync with what was just written (cached copies are decoded text, like obj_fetch returns)
+            self.cache_put(key, response.get("ETag"), obj if isinstance(obj, str) else obj.decode("utf-8"))
+            logger.debug("Successfully wrote S3 object with key: %s", key)
+        except Exception as e:
+            logger.error("Error writing S3 object with key %s: %s", key, e, exc_info=True)
+            raise
+    def obj_fetch(self, key):
+        logger.debug("Attempting to fetch S3 object with key: %s", key)
+        # check the cache for a copy of the object
+        entry = self.cache_get(key)
+        # try to retrieve the object (only if it changed since it was cached)
+        try:
+            if entry:
+                response = self.s3.get_object(Bucket=self.bucket, Key=key, IfNoneMatch=entry[0])
+            else:
+                response = self.s3.get_object(Bucket=self.bucket, Key=key)
+            data = self.decompress(response["Body"].read(), response.get("ContentEncoding")).decode("utf-8")
+            self.cache_put(key, response.get("ETag"), data)
+            logger.debug("Successfully fetched S3 object with key: %s", key)
+            return data
+        except self.s3.exceptions.ClientError as e:
+            code = e.response["Error"]["Code"]
+            # if it hasn't changed, return the cached copy
+            if code in ("304", "NotModified"):
+                logger.debug("Serving S3 object with key %s from cache", key)
+                return entry[1]
+            # if it doesn't exist return None
+            elif code in ("404", "NoSuchKey"):
+                logger.debug("Object with key %s not found", key)
+                with self.cacheLock:
+                    self.cache_drop(key)
+                return None
+            # otherwise, something else went wrong
+            else:
+                logger.error("ClientError fetching object with key %s: %s", key, e, exc_info=True)
+                raise
         except Exception as e:
-            logger.error(f"Error writing S3 object with key {key}: {e}", exc_info=True)
+            logger.error("Unexpected error fetching object with key %s: %s", key, e, exc_info=True)
             raise
     def obj_lookup(self, key):
-        logger.debug(f"Attempting to lookup S3 object with key: {key}")
+        logger.debug("Attempting to lookup S3 object with key: %s", key)
         # try to retrive head of key
         try:
             response = self.s3.head_object(Bucket=self.bucket, Key=key)
-            logger.debug(f"Object found for key: {key}")
+            logger.debug("Object found for key: %s", key)
             return response
         except self.s3.exceptions.ClientError as e:
             # if it doesn't exist return None
             if e.response["Error"]["Code"] == "404":
-                logger.debug(f"Object with key {key} not found")
+                logger.debug("Object with key %s not found", key)
                 return None
             # otherwise, something else went wrong
             else:
-                logger.error(f"ClientError looking up object with key {key}: {e}", exc_info=True)
+                logger.error("ClientError looking up object with key %s: %s", key, e, exc_info=True)
                 raise
         except Exception as e:
-            logger.error(f"Unexpected error looking up object with key {key}: {e}", exc_info=True)
+            logger.error("Unexpected error looking up object with key %s: %s", key, e, exc_info=True)
             raise
     def obj_list(self, key):
-        logger.debug(f"Listing objects in bucket: {self.bucket} under {key}")
+        logger.debug("Listing objects in bucket: %s under %s", self.bucket, key)
         # try to list objects in the bucket
         try:
             paginator = self.s3.get_paginator("list_objects_v2")
@@ -62,8 +156,8 @@ class MyS3Client:
                 for obj in page.get("Contents", []):
                     if obj["Key"] != key:
                         objectKeys.append(obj["Key"])
-            logger.debug(f"Found {len(objectKeys)} objects in bucket under {key}")
+            logger.debug("Found %s objects in bucket under %s", len(objectKeys), key)
             return objectKeys
         except Exception as e:
-            logger.error(f"Error listing objects in bucket under {key}: {e}", exc_info=True)
+            logger.error("Error listing objects in bucket under %s: %s", key, e, exc_info=True)
             raise
@@ -10,7 +10,7 @@ class MySQLClient:
         self.user=user
         self.password=password
         self.db=db
-        logger.debug(f"MySQLClient initialized for DB: {db} on host: {host}")
+        logger.debug("MySQLClient initialized for DB: %s on host: %s", db, host)
     def connect(self):
         logger.debug("Establishing MySQL database connection")
         # try to connect to the database
@@ -25,7 +25,7 @@ class MySQLClient:
             logger.debug("MySQL connection established successfully")
             return conn
         except Exception as e:
-            logger.error(f"Failed to connect to MySQL database: {e}", exc_info=True)
+            logger.error("Failed to connect to MySQL database: %s", e, exc_info=True)
             raise
     def disconnect(self, conn):
         logger.debug("Closing MySQL database connection")
@@ -34,10 +34,10 @@ class MySQLClient:
             conn.close()
             logger.debug("MySQL connection closed")
         except Exception as e:
-            logger.error(f"Error closing MySQL connection: {e}", exc_info=True)
+            logger.error("Error closing MySQL connection: %s", e, exc_info=True)
             raise
     def read_table(self, table):
-        logger.debug(f"Reading all entries from table: {table}")
+        logger.debug("Reading all entries from table: %s", table)
         # start a new connection
         conn = self.connect()
         # try to lookup all users
@@ -45,16 +45,16 @@ class MySQLClient:
             with conn.cursor() as cursor:
                 cursor.execute(f"SELECT * FROM {table}")
                 results = cursor.fetchall()
-            logger.debug(f"Successfully read {len(results)} entries from table: {table}")
+            logger.debug("Successfully read %s entries from table: %s", len(results), table)
             return results
         except Exception as e:
-            logger.error(f"Failed to read from table '{table}': {e}", exc_info=True)
+            logger.error("Failed to read from table '%s': %s", table, e, exc_info=True)
             return []
         # close the connection
         finally:
             self.disconnect(conn)
     def add_entry(self, entry, table):
-        logger.debug(f"Adding entry into table: {table}")
+        logger.debug("Adding entry into table: %s", table)
         # start a new connection
         conn = self.connect()
         # try to add a new user
@@ -69,13 +69,13 @@ class MySQLClient:
             conn.commit()
             logger.debug("Entry added successfully.")
         except Exception as e:
-            logger.error(f"Failed to add entry': {e}", exc_info=True)
+            logger.error("Failed to add entry': %s", e, exc_info=True)
             raise
         # close the connection
         finally:
             self.disconnect(conn)
     def update_entry(self, updateValues, filters, table):
-        logger.debug(f"Updating entry in table: {table}")
+        logger.debug("Updating entry in table: %s", table)
         # start a new connection
         conn = self.connect()
         # try to update a user
@@ -87,15 +87,15 @@ class MySQLClient:
                 sql = f"UPDATE {table} SET {setColumns} WHERE {filterColumns}"
                 cursor.execute(sql, params)
             conn.commit()
-            logger.debug(f"Entry updated successfully.")
+            logger.debug("Entry updated successfully.")
         except Exception as e:
-            logger.error(f"Failed to update entry: {e}", exc_info=True)
+            logger.error("Failed to update entry: %s", e, exc_info=True)
             raise
         # close the connection
         finally:
             self.disconnect(conn)
     def delete_entry(self, filters, table):
-        logger.debug(f"Removing entry in table: {table}")
+        logger.debug("Removing entry in table: %s", table)
         # start a new connection
         conn = self.connect()
         # try to remove a user
@@ -106,10 +106,116 @@ class MySQLClient:
                 sql = f"DELETE FROM {table} WHERE {filterColumns}"
                 cursor.execute(sql, params)
             conn.commit()
-            logger.debug(f"Entry removed successfully.")
+            logger.debug("Entry removed successfully.")
         except Exception as e:
-            logger.error(f"Failed to remove entry: {e}", exc_info=True)
+            logger.error("Failed to remove entry: %s", e, exc_info=True)
             raise
         # close the connection
         finally:
-            self.disconnect(conn)
\ No newline at end of file
+            self.disconnect(conn)
+    def read_entries(self, filters, table):
+        logger.debug("Reading matching entries from table: %s", table)
+        # start a new connection
+        conn = self.connect()
+        # try to lookup matching entries
+        try:
+            with conn.cursor() as cursor:
+                filterColumns = " AND ".join(f"{col} = %s" for col in filters.keys())
+                params = tuple(filters.values())
+                sql = f"SELECT * FROM {table} WHERE {filterColumns}"
+                cursor.execute(sql, params)
+                results = cursor.fetchall()
+            logger.debug("Successfully read %s matching entries from table: %s", len(results), table)
+            return results
+        except Exception as e:
+            logger.error("Failed to read from table '%s': %s", table, e, exc_info=True)
+            return []
+        # close the connection
+        finally:
+            self.disconnect(conn)
+    def read_expired(self, column, cutoff, table, limit):
+        logger.debug("Reading up to %s expired entries from table: %s", limit, table)
+        # start a new connection
+        conn = self.connect()
+        # try to lookup entries that expired before the cutoff
+        try:
+            with conn.cursor() as cursor:
+                sql = f"SELECT * FROM {table} WHERE {column} < %s ORDER BY {column} LIMIT %s"
+                cursor.execute(sql, (cutoff, limit))
+                results = cursor.fetchall()
+            logger.debug("Successfully read %s expired entries from table: %s", len(results), table)
+            return results
+        except Exception as e:
+            logger.error("Failed to read expired entries from table '%s': %s", table, e, exc_info=True)
+            raise
+        # close the connection
+        finally:
+            self.disconnect(conn)
+    def delete_expired(self, column, cutoff, table, limit):
+        logger.debug("Removing up to %s expired entries in table: %s", limit, table)
+        # start a new connection
+        conn = self.connect()
+        # try to remove a bounded batch of entries that expired before the cutoff
+        try:
+            with conn.cursor() as cursor:
+                sql = f"DELETE FROM {table} WHERE {column} < %s ORDER BY {column} LIMIT %s"
+                cursor.execute(sql, (cutoff, limit))
+                deleted = cursor.rowcount
+            conn.commit()
+            logger.debug("Removed %s expired entries.", deleted)
+            return deleted
+        except Exception as e:
+            logger.error("Failed to remove expired entries: %s", e, exc_info=True)
+            raise
+        # close the connection
+        finally:
+            self.disconnect(conn)
+    def delete_in(self, column, values, filters, table, expired=None):
+        logger.debug("Removing %s entries in table: %s", len(values), table)
+        # start a new connection
+        conn = self.connect()
+        # try to remove entries whose column matches one of the values (and, if given, expired before (column, cutoff))
+        try:
+            with conn.cursor() as cursor:
+                placeholders = ", ".join(["%s"]*len(values))
+                filterColumns = "".join(f" AND {col} = %s" for col in filters.keys())
+                params = tuple(values) + tuple(filters.values())
+                if expired:
+                    filterColumns += f" AND {expired[0]} < %s"
+                    params += (expired[1],)
+                sql = f"DELETE FROM {table} WHERE {column} IN ({placeholders}){filterColumns}"
+                cursor.execute(sql, params)
+                deleted = cursor.rowcount
+            conn.commit()
+            logger.debug("Removed %s entries.", deleted)
+            return deleted
+        except Exception as e:
+            logger.error("Failed to remove entries: %s", e, exc_info=True)
+            raise
+        # close the connection
+        finally:
+            self.disconnect(conn)
+    def ensure_index(self, indexName, columns, table):
+        logger.debug("Ensuring index %s exists on table: %s", indexName, table)
+        # start a new connection
+        conn = self.connect()
+        # try to create the index if it doesn't exist yet
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM information_schema.statistics WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s LIMIT 1",
+                    (table, indexName)
+                )
+                if cursor.fetchone():
+                    logger.debug("Index %s already exists on table: %s", indexName, table)
+                    return False
+                cursor.execute(f"CREATE INDEX {indexName} ON {table} ({', '.join(columns)})")
+            conn.commit()
+            logger.info("Created index %s on table: %s", indexName, table)
+            return True
+        except Exception as e:
+            logger.error("Failed to create index %s on table '%s': %s", indexName, table, e, exc_info=True)
+            raise
+        # close the connection
+        finally:
+            self.disconnect(conn)